@@ -1,9 +1,29 @@
-from flask import Flask, jsonify, request
-import psycopg2
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from flask.json.provider import JSONProvider
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from psycopg2.extras import execute_values
+from cachetools import TTLCache
+from contextlib import contextmanager
+from itertools import combinations
+import orjson
 import os
-from datetime import datetime
+import threading
+import weakref
+
+class OrjsonProvider(JSONProvider):
+    # jsonify y request.get_json pasan por orjson en vez del json estándar
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configuración de la base de datos
 DATABASE_CONFIG = {
@@ -11,53 +31,362 @@ DATABASE_CONFIG = {
     'database': os.environ.get('DB_NAME', 'crud_db'),
     'user': os.environ.get('DB_USER', 'postgres'),
     'password': os.environ.get('DB_PASSWORD', 'password'),
-    'port': os.environ.get('DB_PORT', '5432')
+    'port': os.environ.get('DB_PORT', '5432'),
+    # Identifica las sesiones de la API en pg_stat_activity / pg_stat_statements
+    'application_name': os.environ.get('DB_APPLICATION_NAME', 'apirest')
+}
+
+# GUCs de sesión: sin JIT (su arranque cuesta más que estas consultas OLTP) y
+# un tope por consulta para que una lenta no retenga una conexión del pool.
+# PgBouncer rechaza el parámetro de arranque 'options'; detrás de él se deja
+# DB_OPTIONS vacío y los fija el connect_query de pgbouncer.ini
+DB_OPTIONS = os.environ.get('DB_OPTIONS', '-c jit=off -c statement_timeout=5000')
+if DB_OPTIONS:
+    DATABASE_CONFIG['options'] = DB_OPTIONS
+
+# Paginación por cursor (keyset) en GET /productos
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Filas por FETCH del cursor de servidor al listar sin paginar
+STREAM_BATCH_SIZE = 2000
+
+# Páginas del listado ya serializadas, por (after_id, limit). Es por proceso:
+# las escrituras de este worker la vacían y las de otros workers se ven como
+# mucho tras el TTL
+LIST_CACHE = TTLCache(maxsize=128, ttl=5)
+list_cache_lock = threading.Lock()
+# Se incrementa en cada invalidación. Una página leída antes de una escritura
+# de este worker solo se guarda si la generación no cambió mientras tanto
+list_cache_generation = 0
+
+# Columnas que devuelven los endpoints de productos y SQL derivado,
+# construidos una sola vez al importar
+# Las conversiones de tipo se hacen en PostgreSQL: precio llega como float8
+# (sin Decimal) y fecha_creacion como texto ISO 8601 (sin datetime)
+PRODUCT_COLUMNS = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'precio': 'precio::float8',
+    'stock': 'stock',
+    'fecha_creacion': '''to_char(fecha_creacion, 'YYYY-MM-DD"T"HH24:MI:SS.US')'''
 }
+PRODUCT_COLUMNS_SQL = ', '.join(f'{expr} AS {col}' if expr != col else col for col, expr in PRODUCT_COLUMNS.items())
+SELECT_QUERY = f'SELECT {PRODUCT_COLUMNS_SQL} FROM productos'
+SELECT_ALL_SQL = f'{SELECT_QUERY} ORDER BY id'
+
+# Columnas que PUT /productos/<id> puede modificar
+PRODUCT_UPDATABLE = ('nombre', 'precio', 'stock')
+
+class KeepAliveConnectionPool(ThreadedConnectionPool):
+    # ThreadedConnectionPool cierra la conexión devuelta si ya hay minconn
+    # libres, y cada pico de concurrencia vuelve a abrir (y autenticar)
+    # conexiones. Aquí se conservan hasta maxconn: minconn solo decide cuántas
+    # se abren al crear el pool. _putconn corre bajo el lock del pool
+    def _putconn(self, conn, key=None, close=False):
+        minconn = self.minconn
+        self.minconn = self.maxconn
+        try:
+            super()._putconn(conn, key, close)
+        finally:
+            self.minconn = minconn
+
+# Pool de conexiones compartido entre requests (evita un connect por request).
+# Se abren a demanda hasta DB_POOL_MAX y no se cierran al devolverlas
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '20'))
+db_pool = KeepAliveConnectionPool(
+    int(os.environ.get('DB_POOL_MIN', '2')),
+    DB_POOL_MAX,
+    **DATABASE_CONFIG
+)
+
+# ThreadedConnectionPool lanza PoolError si está agotado. Con workers gevent
+# hay muchos más requests en vuelo que conexiones, así que se espera un
+# hueco libre (hasta DB_POOL_TIMEOUT segundos) antes de pedir una
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+db_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+# Consultas calientes. Con DB_PREPARED_STATEMENTS=1 se preparan una vez por
+# conexión (PREPARE) y se ejecutan con EXECUTE, sin que el servidor vuelva a
+# parsear y planificar. Detrás de PgBouncer en modo transaction hay que
+# desactivarlo: un PREPARE solo existe en la conexión de servidor que lo creó.
+USE_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') == '1'
+
+STATEMENTS = {
+    'get_producto': f'{SELECT_QUERY} WHERE id = %s',
+    'page_productos': f'{SELECT_QUERY} WHERE id > %s ORDER BY id LIMIT %s',
+    'insert_producto': f'INSERT INTO productos (nombre, precio, stock) VALUES (%s, %s, %s) RETURNING {PRODUCT_COLUMNS_SQL}',
+    'delete_producto': 'DELETE FROM productos WHERE id = %s RETURNING id, nombre',
+    'version_productos': 'SELECT version FROM productos_version'
+}
+
+def _update_statements():
+    # Las 7 variantes del UPDATE (una por subconjunto no vacío de
+    # PRODUCT_UPDATABLE). Las columnas siguen siempre el orden de
+    # PRODUCT_UPDATABLE, así que cada conjunto de campos tiene un único texto
+    # SQL. Devuelve {nombre: sql} y {frozenset(columnas): nombre}
+    sentencias, nombres = {}, {}
+    for n in range(1, len(PRODUCT_UPDATABLE) + 1):
+        for columnas in combinations(PRODUCT_UPDATABLE, n):
+            nombre = 'update_producto_' + '_'.join(columnas)
+            sentencias[nombre] = (
+                f'UPDATE productos SET {", ".join(f"{col} = %s" for col in columnas)} '
+                f'WHERE id = %s RETURNING {PRODUCT_COLUMNS_SQL}'
+            )
+            nombres[frozenset(columnas)] = nombre
+    return sentencias, nombres
+
+# Generadas una sola vez al importar
+UPDATE_SQL, UPDATE_STATEMENTS = _update_statements()
+STATEMENTS.update(UPDATE_SQL)
+
+def _prepare_sql(nombre, sql):
+    # Los %s de psycopg2 pasan a ser $1, $2, ... en el PREPARE
+    partes = sql.split('%s')
+    cuerpo = partes[0] + ''.join(f'${i}{parte}' for i, parte in enumerate(partes[1:], 1))
+    return f'PREPARE {nombre} AS {cuerpo}'
+
+def _execute_sql(nombre, sql):
+    n = sql.count('%s')
+    return f'EXECUTE {nombre} ({", ".join(["%s"] * n)})' if n else f'EXECUTE {nombre}'
+
+# Todas las sentencias en un solo envío (un roundtrip por conexión nueva). El
+# DEALLOCATE ALL inicial limpia restos de un intento anterior fallido a medias
+PREPARE_SQL = '; '.join(['DEALLOCATE ALL', *(_prepare_sql(nombre, sql) for nombre, sql in STATEMENTS.items())])
+# Texto que se envía para cada sentencia: EXECUTE o el SQL directo. Ya en
+# bytes, así psycopg2 no vuelve a codificar la cadena en cada execute
+STATEMENT_SQL = {
+    nombre: (_execute_sql(nombre, sql) if USE_PREPARED_STATEMENTS else sql).encode()
+    for nombre, sql in STATEMENTS.items()
+}
+
+# Conexiones del pool que ya tienen las sentencias preparadas
+_prepared_conns = weakref.WeakSet()
+
+def prepare_statements(conn):
+    with conn.cursor() as cur:
+        cur.execute(PREPARE_SQL)
+    _prepared_conns.add(conn)
+
+def execute_statement(cur, nombre, params=None):
+    cur.execute(STATEMENT_SQL[nombre], params)
 
 def get_db_connection():
-    return psycopg2.connect(**DATABASE_CONFIG)
+    # Una sola conexión del pool por request; se devuelve en teardown_request
+    if 'db_conn' not in g:
+        if not db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise PoolError('connection pool exhausted')
+        try:
+            conn = g.db_conn = db_pool.getconn()
+        except Exception:
+            db_pool_slots.release()
+            raise
+        # Las lecturas corren en transacciones READ ONLY
+        conn.readonly = request.method in ('GET', 'HEAD')
+        if USE_PREPARED_STATEMENTS and conn not in _prepared_conns:
+            prepare_statements(conn)
+    return g.db_conn
 
-def init_db():
+@app.teardown_request
+def release_db_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        try:
+            # putconn hace rollback de cualquier transacción pendiente
+            db_pool.putconn(conn)
+        finally:
+            db_pool_slots.release()
+
+@contextmanager
+def get_db_cursor(commit=False, name=None):
     conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Crear tabla de productos
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS productos (
-            id SERIAL PRIMARY KEY,
-            nombre VARCHAR(100) NOT NULL,
-            precio DECIMAL(10,2) NOT NULL,
-            stock INTEGER DEFAULT 0,
-            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Insertar datos de ejemplo
-    cur.execute('''
-        INSERT INTO productos (nombre, precio, stock) 
-        VALUES 
-            ('Laptop', 1200.50, 10),
-            ('Mouse', 25.99, 50),
-            ('Teclado', 75.00, 30)
-        ON CONFLICT DO NOTHING
-    ''')
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    # Con name se crea un cursor de servidor (las filas se traen por lotes)
+    with conn.cursor(name=name) as cur:
+        yield cur
+    # El commit ocurre antes de responder, así un fallo aún devuelve 500
+    if commit:
+        conn.commit()
+
+def fetch_dicts(cur):
+    # Nombres de columna una sola vez por consulta, no por fila
+    columnas = [col[0] for col in cur.description]
+    return [dict(zip(columnas, row)) for row in cur]
+
+def fetch_dict(cur):
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0] for col in cur.description], row))
+
+def build_update(data, key):
+    # Campos permitidos que vienen en data (None se ignora), en el orden de
+    # PRODUCT_UPDATABLE: devuelve la sentencia precalculada y sus parámetros
+    fields = {k: data[k] for k in PRODUCT_UPDATABLE if data.get(k) is not None}
+    if not fields:
+        return None, None
+    return UPDATE_STATEMENTS[frozenset(fields)], [*fields.values(), key]
+
+def productos_etag():
+    # La versión la incrementa un trigger en cada escritura sobre productos,
+    # así que sirve de ETag del listado sin leer la tabla
+    with get_db_cursor() as cur:
+        execute_statement(cur, 'version_productos')
+        return f'productos-{cur.fetchone()[0]}'
+
+def invalidate_list_cache():
+    global list_cache_generation
+    with list_cache_lock:
+        list_cache_generation += 1
+        LIST_CACHE.clear()
+
+def stream_productos():
+    # Emite el listado completo como un array JSON, lote a lote, sin
+    # materializar todas las filas en memoria
+    with get_db_cursor(name='productos_stream') as cur:
+        cur.execute(SELECT_ALL_SQL)
+        filas = cur.fetchmany(STREAM_BATCH_SIZE)
+        columnas = [col[0] for col in cur.description]
+        # Primer yield vacío: la vista lo consume para ejecutar la consulta
+        # antes de empezar la respuesta
+        yield b''
+        yield b'['
+        separador = b''
+        while filas:
+            lote = orjson.dumps([dict(zip(columnas, fila)) for fila in filas])
+            yield separador + lote[1:-1]
+            separador = b','
+            filas = cur.fetchmany(STREAM_BATCH_SIZE)
+        yield b']'
+
+def init_db():
+    # Conexión directa del pool: las sentencias preparadas requieren que la
+    # tabla ya exista, así que aquí no se usa get_db_cursor
+    conn = db_pool.getconn()
+    try:
+        # La conexión puede volver al pool en modo READ ONLY tras un GET
+        conn.readonly = False
+        with conn.cursor() as cur:
+            # Sin statement_timeout mientras dura esta transacción: crear
+            # índices sobre una tabla grande tarda más que el tope pensado
+            # para los requests. SET LOCAL y no SET: detrás de PgBouncer en
+            # modo transaction la conexión de servidor vuelve al pool tras el
+            # COMMIT y seguiría sin tope atendiendo a la API
+            cur.execute('SET LOCAL statement_timeout = 0')
+            
+            # ¿Primer arranque? Solo entonces hace falta el VACUUM del final
+            cur.execute('''
+                SELECT to_regclass('productos') IS NULL
+                    OR to_regclass('idx_productos_id_covering') IS NULL
+            ''')
+            recien_creada = cur.fetchone()[0]
+            
+            # Crear tabla de productos
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS productos (
+                    id SERIAL PRIMARY KEY,
+                    nombre VARCHAR(100) NOT NULL,
+                    precio DECIMAL(10,2) NOT NULL,
+                    stock INTEGER DEFAULT 0,
+                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+            # Índice para búsquedas por nombre sin distinguir mayúsculas
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos (lower(nombre))')
+            # Índice cubriente: el listado ordenado por id se resuelve con index-only scan
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_productos_id_covering
+                ON productos (id) INCLUDE (nombre, precio, stock, fecha_creacion)
+            ''')
+            
+            # Versión del listado para ETag: triggers por sentencia la
+            # incrementan en cada INSERT/UPDATE/DELETE/TRUNCATE que cambia filas
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS productos_version (
+                    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                    version BIGINT NOT NULL DEFAULT 0
+                )
+            ''')
+            cur.execute('INSERT INTO productos_version DEFAULT VALUES ON CONFLICT DO NOTHING')
+            cur.execute('''
+                CREATE OR REPLACE FUNCTION bump_productos_version() RETURNS trigger AS $$
+                BEGIN
+                    -- Un UPDATE/DELETE sin filas (un 404) no cambia el listado
+                    IF TG_OP <> 'TRUNCATE' THEN
+                        IF NOT EXISTS (SELECT 1 FROM cambios) THEN
+                            RETURN NULL;
+                        END IF;
+                    END IF;
+                    UPDATE productos_version SET version = version + 1;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            ''')
+            # Las tablas de transición exigen un trigger por evento
+            for evento, tabla in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                cur.execute(f'''
+                    CREATE OR REPLACE TRIGGER productos_version_{evento.lower()}
+                    AFTER {evento} ON productos
+                    REFERENCING {tabla} TABLE AS cambios
+                    FOR EACH STATEMENT EXECUTE FUNCTION bump_productos_version()
+                ''')
+            cur.execute('''
+                CREATE OR REPLACE TRIGGER productos_version_truncate
+                AFTER TRUNCATE ON productos
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_productos_version()
+            ''')
+        
+            # Insertar datos de ejemplo
+            bulk_create_productos(cur, [
+                ('Laptop', 1200.50, 10),
+                ('Mouse', 25.99, 50),
+                ('Teclado', 75.00, 30)
+            ])
+        conn.commit()
+        
+        # VACUUM no puede ir dentro de una transacción. Deja al día el
+        # visibility map (index-only scans con el índice cubriente) y las
+        # estadísticas del planificador. init-db corre en cada arranque del
+        # contenedor: después de la creación se encarga autovacuum. Corre con
+        # el statement_timeout por defecto (el SET LOCAL ya terminó), sin SET
+        # de sesión que PgBouncer pudiera dejar en otra conexión de servidor
+        if recien_creada:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('VACUUM ANALYZE productos')
+            finally:
+                conn.autocommit = False
+    finally:
+        db_pool.putconn(conn)
+
+def bulk_create_productos(cur, rows):
+    # Inserta muchas filas (nombre, precio, stock) en un solo roundtrip por página
+    result = execute_values(
+        cur,
+        'INSERT INTO productos (nombre, precio, stock) VALUES %s RETURNING id',
+        rows,
+        page_size=1000,
+        fetch=True
+    )
+    return [row[0] for row in result]
+
+# Respuesta estática de la raíz, serializada una sola vez
+HOME_BODY = orjson.dumps({
+    "message": "API CRUD Python + PostgreSQL",
+    "endpoints": {
+        "GET /productos": "Listar todos los productos",
+        "GET /productos?limit=<n>&after_id=<id>": "Listar productos paginados por cursor",
+        "GET /productos/<id>": "Obtener un producto por ID",
+        "POST /productos": "Crear nuevo producto",
+        "PUT /productos/<id>": "Actualizar producto",
+        "DELETE /productos/<id>": "Eliminar producto"
+    }
+})
 
 @app.route('/')
 def home():
-    return jsonify({
-        "message": "API CRUD Python + PostgreSQL",
-        "endpoints": {
-            "GET /productos": "Listar todos los productos",
-            "GET /productos/<id>": "Obtener un producto por ID",
-            "POST /productos": "Crear nuevo producto",
-            "PUT /productos/<id>": "Actualizar producto",
-            "DELETE /productos/<id>": "Eliminar producto"
-        }
-    })
+    return app.response_class(HOME_BODY, mimetype='application/json')
 
 # CREATE - Crear producto
 @app.route('/productos', methods=['POST'])
@@ -68,27 +397,14 @@ def crear_producto():
         if not data or not data.get('nombre') or not data.get('precio'):
             return jsonify({"error": "Nombre y precio son requeridos"}), 400
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute(
-            'INSERT INTO productos (nombre, precio, stock) VALUES (%s, %s, %s) RETURNING id, nombre, precio, stock, fecha_creacion',
-            (data['nombre'], float(data['precio']), data.get('stock', 0))
-        )
-        
-        nuevo_producto = cur.fetchone()
-        conn.commit()
-        
-        producto = {
-            'id': nuevo_producto[0],
-            'nombre': nuevo_producto[1],
-            'precio': float(nuevo_producto[2]),
-            'stock': nuevo_producto[3],
-            'fecha_creacion': nuevo_producto[4]
-        }
+        with get_db_cursor(commit=True) as cur:
+            execute_statement(
+                cur, 'insert_producto',
+                (data['nombre'], float(data['precio']), data.get('stock', 0))
+            )
+            producto = fetch_dict(cur)
+        invalidate_list_cache()
         
-        cur.close()
-        conn.close()
         return jsonify(producto), 201
         
     except Exception as e:
@@ -98,24 +414,52 @@ def crear_producto():
 @app.route('/productos', methods=['GET'])
 def obtener_productos():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT id, nombre, precio, stock, fecha_creacion FROM productos ORDER BY id')
-        productos = cur.fetchall()
-        
-        productos_list = []
-        for producto in productos:
-            productos_list.append({
-                'id': producto[0],
-                'nombre': producto[1],
-                'precio': float(producto[2]),
-                'stock': producto[3],
-                'fecha_creacion': producto[4]
-            })
+        paginado = 'limit' in request.args or 'after_id' in request.args
+        pagina = None
+        
+        if paginado:
+            # Keyset: WHERE id > ultimo_id usa el índice de la PK, sin OFFSET
+            limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+            after_id = request.args.get('after_id', 0, type=int)
+            with list_cache_lock:
+                pagina = LIST_CACHE.get((after_id, limit))
+                generacion = list_cache_generation
+        
+        # Una página en caché trae su ETag, sin consultar la base
+        etag = pagina[0] if pagina else productos_etag()
+        
+        # GET condicional: si el cliente ya tiene esta versión, 304 sin cuerpo
+        # Comparación débil (RFC 9110): un proxy que comprime puede devolver W/"..."
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        if not paginado:
+            stream = stream_productos()
+            # Ejecuta la consulta aquí para que un error aún pueda devolver 500
+            next(stream)
+            # stream_with_context retrasa teardown_request (y la devolución de
+            # la conexión al pool) hasta terminar de emitir
+            response = Response(stream_with_context(stream), mimetype='application/json')
+            response.set_etag(etag)
+            return response
+        
+        if pagina is None:
+            with get_db_cursor() as cur:
+                execute_statement(cur, 'page_productos', (after_id, limit))
+                productos_list = fetch_dicts(cur)
+            
+            # El cliente pide la siguiente página con after_id=next_cursor
+            next_cursor = productos_list[-1]['id'] if len(productos_list) == limit else None
+            pagina = (etag, orjson.dumps({"productos": productos_list, "next_cursor": next_cursor}))
+            with list_cache_lock:
+                if generacion == list_cache_generation:
+                    LIST_CACHE[(after_id, limit)] = pagina
         
-        cur.close()
-        conn.close()
-        return jsonify(productos_list)
+        response = app.response_class(pagina[1], mimetype='application/json')
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -124,25 +468,13 @@ def obtener_productos():
 @app.route('/productos/<int:producto_id>', methods=['GET'])
 def obtener_producto(producto_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT id, nombre, precio, stock, fecha_creacion FROM productos WHERE id = %s', (producto_id,))
-        producto = cur.fetchone()
+        with get_db_cursor() as cur:
+            execute_statement(cur, 'get_producto', (producto_id,))
+            producto = fetch_dict(cur)
         
         if producto:
-            producto_data = {
-                'id': producto[0],
-                'nombre': producto[1],
-                'precio': float(producto[2]),
-                'stock': producto[3],
-                'fecha_creacion': producto[4]
-            }
-            cur.close()
-            conn.close()
-            return jsonify(producto_data)
+            return jsonify(producto)
         else:
-            cur.close()
-            conn.close()
             return jsonify({"error": "Producto no encontrado"}), 404
             
     except Exception as e:
@@ -154,50 +486,26 @@ def actualizar_producto(producto_id):
     try:
         data = request.get_json()
         
-        conn = get_db_connection()
-        cur = conn.cursor()
+        # Un cuerpo JSON que no es un objeto (p. ej. [1]) no trae campos
+        if not isinstance(data, dict):
+            return jsonify({"error": "No hay campos para actualizar"}), 400
         
-        # Verificar si el producto existe
-        cur.execute('SELECT id FROM productos WHERE id = %s', (producto_id,))
-        if not cur.fetchone():
-            cur.close()
-            conn.close()
-            return jsonify({"error": "Producto no encontrado"}), 404
+        if data.get('precio') is not None:
+            data['precio'] = float(data['precio'])
         
-        # Construir query dinámico
-        update_fields = []
-        values = []
-        
-        if 'nombre' in data:
-            update_fields.append("nombre = %s")
-            values.append(data['nombre'])
-        if 'precio' in data:
-            update_fields.append("precio = %s")
-            values.append(float(data['precio']))
-        if 'stock' in data:
-            update_fields.append("stock = %s")
-            values.append(data['stock'])
-        
-        if not update_fields:
+        statement, values = build_update(data, producto_id)
+        if not statement:
             return jsonify({"error": "No hay campos para actualizar"}), 400
         
-        values.append(producto_id)
-        query = f'UPDATE productos SET {", ".join(update_fields)} WHERE id = %s RETURNING id, nombre, precio, stock, fecha_creacion'
-        
-        cur.execute(query, values)
-        producto_actualizado = cur.fetchone()
-        conn.commit()
+        # Sin SELECT previo: si el UPDATE no devuelve fila, el producto no existe
+        with get_db_cursor(commit=True) as cur:
+            execute_statement(cur, statement, values)
+            producto = fetch_dict(cur)
+        invalidate_list_cache()
         
-        producto = {
-            'id': producto_actualizado[0],
-            'nombre': producto_actualizado[1],
-            'precio': float(producto_actualizado[2]),
-            'stock': producto_actualizado[3],
-            'fecha_creacion': producto_actualizado[4]
-        }
+        if not producto:
+            return jsonify({"error": "Producto no encontrado"}), 404
         
-        cur.close()
-        conn.close()
         return jsonify(producto)
         
     except Exception as e:
@@ -207,32 +515,28 @@ def actualizar_producto(producto_id):
 @app.route('/productos/<int:producto_id>', methods=['DELETE'])
 def eliminar_producto(producto_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute('DELETE FROM productos WHERE id = %s RETURNING id, nombre', (producto_id,))
-        producto_eliminado = cur.fetchone()
+        with get_db_cursor(commit=True) as cur:
+            execute_statement(cur, 'delete_producto', (producto_id,))
+            producto_eliminado = fetch_dict(cur)
+        invalidate_list_cache()
         
         if producto_eliminado:
-            conn.commit()
-            cur.close()
-            conn.close()
             return jsonify({
                 "message": "Producto eliminado correctamente",
-                "producto": {
-                    "id": producto_eliminado[0],
-                    "nombre": producto_eliminado[1]
-                }
+                "producto": producto_eliminado
             })
         else:
-            conn.rollback()
-            cur.close()
-            conn.close()
             return jsonify({"error": "Producto no encontrado"}), 404
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.cli.command('init-db')
+def init_db_command():
+    # En producción: flask --app app init-db antes de arrancar gunicorn
+    init_db()
+
 if __name__ == '__main__':
+    # Servidor de desarrollo; en producción se usa gunicorn (ver Dockerfile)
     init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
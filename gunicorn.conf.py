@@ -0,0 +1,20 @@
+import os
+
+bind = '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+
+# gevent: cada worker atiende muchos requests a la vez mientras esperan a
+# PostgreSQL. Con GUNICORN_WORKER_CLASS=gthread se usan hilos en su lugar
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+def post_fork(server, worker):
+    # psycopg2 bloquea el proceso entero al esperar a la base; psycogreen hace
+    # que esas esperas cedan el control a otros greenlets. Debe aplicarse antes
+    # de importar app.py, que abre el pool de conexiones. Se mira la clase del
+    # worker real, no la variable de arriba: -k gevent en la línea de
+    # comandos la sobrescribe
+    if any(c.__module__ == 'gunicorn.workers.ggevent' for c in type(worker).__mro__):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()